@@ -1,25 +1,25 @@
 """
 ChatGPT-powered FAQ system for natural language responses using KB facts
 """
+import functools
 import os
+import re
 from openai import OpenAI
 from typing import Optional
 from dotenv import load_dotenv
 
-class ChatGPTFAQ:
-    def __init__(self):
-        # Initialize client only if API key is available
-        load_dotenv()
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key:
-            self.client = OpenAI(api_key=api_key)
-            self.api_available = True
-        else:
-            self.client = None
-            self.api_available = False
-            print("Warning: OPENAI_API_KEY not set. ChatGPT features will use fallback responses.")
-        
-        self.system_prompt = """あなたは美容室「SalonAI 表参道店」のスタッフです。
+# Keywords for queries that need human guidance
+_DANGEROUS_KEYWORDS = (
+    "薬", "薬剤", "治療", "診断", "病気", "症状", "副作用",
+    "アレルギー", "妊娠", "授乳", "医療", "医師", "病院"
+)
+# One alternation scans the query once instead of once per keyword
+_DANGEROUS_PATTERN = re.compile('|'.join(map(re.escape, _DANGEROUS_KEYWORDS)))
+
+COMPLETION_CACHE_SIZE = 1024
+
+# Static system prompt; sent as its own first message so the request prefix never changes
+_SYSTEM_PROMPT = """あなたは美容室「SalonAI 表参道店」のスタッフです。
 
 【重要なルール】
 - 提供されたKB情報のみを使用して回答してください
@@ -39,6 +39,23 @@ class ChatGPTFAQ:
 - 医療アドバイス
 - 競合他社との比較
 - 価格の推測"""
+
+class ChatGPTFAQ:
+    def __init__(self):
+        # Initialize client only if API key is available
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+        if api_key:
+            self.client = OpenAI(api_key=api_key)
+            self.api_available = True
+        else:
+            self.client = None
+            self.api_available = False
+            print("Warning: OPENAI_API_KEY not set. ChatGPT features will use fallback responses.")
+        
+        self.system_prompt = _SYSTEM_PROMPT
+        # The same question with the same KB facts reuses the earlier answer (failed calls aren't cached)
+        self._complete = functools.lru_cache(maxsize=COMPLETION_CACHE_SIZE)(self._complete)
     
     def get_response(self, user_message: str, kb_facts: Optional[dict] = None) -> str:
         """
@@ -65,40 +82,44 @@ class ChatGPTFAQ:
                         context += f"- {key}: {value}\n"
                     context += "\n上記のKB情報のみを使用して回答してください。"
             
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt + context},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
+            return self._complete(context, user_message)
             
         except Exception as e:
             print(f"ChatGPT API error: {e}")
             # Fallback: if we have KB facts, provide a simple response
             return self._generate_fallback_response(kb_facts)
     
+    def _complete(self, context: str, user_message: str) -> str:
+        """Call the chat completion API (memoized per instance in __init__)"""
+        response = self.client.chat.completions.create(
+            model="gpt-4-turbo",
+            messages=self._build_messages(context, user_message),
+            max_tokens=500,
+            temperature=0.7
+        )
+        
+        return response.choices[0].message.content.strip()
+    
+    def _build_messages(self, context: str, user_message: str) -> list:
+        """Static system prompt first so the request prefix stays identical across calls"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if context:
+            # Per-request KB facts go after the static prefix
+            messages.append({"role": "system", "content": context.strip()})
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
     def _generate_fallback_response(self, kb_facts: Optional[dict] = None) -> str:
         """Generate a fallback response using KB facts when ChatGPT API is not available"""
         if kb_facts:
             facts_dict = kb_facts.get('kb_facts', kb_facts) if isinstance(kb_facts, dict) else {}
             if facts_dict:
                 # Return the first available fact as a simple response
-                for key, value in facts_dict.items():
-                    return f"{value}です。"
+                return f"{next(iter(facts_dict.values()))}です。"
         
         return "申し訳ございませんが、その質問については分かりません。直接お問い合わせください。"
     
     def _is_dangerous_query(self, message: str) -> bool:
         """Check if query is in dangerous areas that need human guidance"""
-        dangerous_keywords = [
-            "薬", "薬剤", "治療", "診断", "病気", "症状", "副作用",
-            "アレルギー", "妊娠", "授乳", "医療", "医師", "病院"
-        ]
-        
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in dangerous_keywords)
\ No newline at end of file
+        # The keywords are all Japanese, so no case folding is needed
+        return _DANGEROUS_PATTERN.search(message) is not None
\ No newline at end of file
@@ -4,6 +4,7 @@ Google Calendar integration for salon reservations
 import os
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 import pytz
@@ -25,13 +26,31 @@ class GoogleCalendarHelper:
         self.staff_data = self.services_data.get("staff", {})
         self.services = self.services_data.get("services", {})
         
+        # Millisecond timestamp behind the last reservation ID handed out
+        self._reservation_id_lock = threading.Lock()
+        self._last_reservation_ms = 0
+        
         # Initialize Google Calendar service
-        self.service = None
+        self._credentials = None
+        self._local = threading.local()
         try:
             self._authenticate()
         except Exception as e:
             print(f"Failed to initialize Google Calendar: {e}")
-            self.service = None
+            self._credentials = None
+    
+    @property
+    def service(self):
+        """
+        Calendar API client for the calling thread, or None if not authenticated
+        The client's httplib2 connection isn't thread-safe, so each thread builds its own
+        """
+        if self._credentials is None:
+            return None
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = build('calendar', 'v3', credentials=self._credentials)
+        return service
     
     def _normalize_time_format(self, time_str: str) -> str:
         """Normalize time string to HH:MM format (zero-padded)"""
@@ -99,13 +118,14 @@ class GoogleCalendarHelper:
                 scopes=['https://www.googleapis.com/auth/calendar']
             )
             
-            # Build the service
-            self.service = build('calendar', 'v3', credentials=credentials)
+            # Build the service (for this thread; other threads build theirs on first use)
+            self._local.service = build('calendar', 'v3', credentials=credentials)
+            self._credentials = credentials
             print("Google Calendar API authenticated successfully")
             
         except Exception as e:
             print(f"Failed to authenticate with Google Calendar: {e}")
-            self.service = None
+            self._credentials = None
     
     def generate_reservation_id(self, date_str: str) -> str:
         """Generate a unique reservation ID in format RES-YYYYMMDD-XXXX"""
@@ -115,7 +135,11 @@ class GoogleCalendarHelper:
         
         # For simplicity, use timestamp-based counter (in real app, use database counter)
         import time
-        counter = int(time.time() * 1000) % 10000  # Last 4 digits of timestamp
+        with self._reservation_id_lock:
+            # Never reuse a millisecond, so concurrent calls get different IDs
+            now_ms = max(int(time.time() * 1000), self._last_reservation_ms + 1)
+            self._last_reservation_ms = now_ms
+        counter = now_ms % 10000  # Last 4 digits of timestamp
         
         return f"RES-{date_part}-{counter:04d}"
     
@@ -2,13 +2,15 @@ import os
 import logging
 import time
 import threading
+import weakref
 from fastapi import FastAPI, Request, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import Configuration, ApiClient, MessagingApi, ReplyMessageRequest, TextMessage, TemplateMessage, ButtonsTemplate, MessageAction
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, FollowEvent
-from api.rag_faq import RAGFAQ
+from api.rag_faq import get_ragfaq
 from api.chatgpt_faq import ChatGPTFAQ
 from api.reservation_flow import ReservationFlow
 from api.google_sheets_logger import GoogleSheetsLogger
@@ -27,7 +29,7 @@ handler = WebhookHandler(LINE_CHANNEL_SECRET)
 
 # Initialize AI modules with error handling
 try:
-    rag_faq = RAGFAQ()
+    rag_faq = get_ragfaq()
     chatgpt_faq = ChatGPTFAQ()
     reservation_flow = ReservationFlow()
     sheets_logger = GoogleSheetsLogger()
@@ -46,6 +48,12 @@ except Exception as e:
 
 app = FastAPI()
 
+# Webhook handlers run in worker threads; a user's events share reservation/consent state,
+# so each user's events are handled one at a time (a lock is dropped once unused).
+# Bookings across users are serialized in reservation_flow.
+_user_locks = weakref.WeakValueDictionary()
+_user_locks_guard = threading.Lock()
+
 # Global variable to track scheduler thread
 scheduler_thread = None
 
@@ -80,8 +88,8 @@ async def shutdown_event():
     
     if scheduler_thread and scheduler_thread.is_alive():
         print("Stopping reminder scheduler...")
-        # Note: The scheduler thread will stop when the main process exits
-        # since it's marked as daemon=True
+        # Wakes the scheduler thread from its wait so it exits right away
+        reminder_scheduler.stop()
 
 @app.get("/")
 async def health():
@@ -104,7 +112,8 @@ async def callback(request: Request, x_line_signature: str = Header(None)):
     body_str = body.decode("utf-8")
 
     try:
-        handler.handle(body_str, x_line_signature)
+        # Handlers block on LINE/OpenAI/Sheets calls and the KB search; keep them off the event loop
+        await run_in_threadpool(handler.handle, body_str, x_line_signature)
     except InvalidSignatureError as e:
         logging.error(f"Signature error: {e}")
         raise HTTPException(status_code=400, detail="Invalid signature")
@@ -113,8 +122,22 @@ async def callback(request: Request, x_line_signature: str = Header(None)):
         raise HTTPException(status_code=401, detail=str(e))
     return "OK"
 
+def _get_user_lock(user_id: str) -> threading.Lock:
+    """Lock serializing event handling for one user"""
+    with _user_locks_guard:
+        lock = _user_locks.get(user_id)
+        if lock is None:
+            lock = _user_locks[user_id] = threading.Lock()
+        return lock
+
+
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_message(event: MessageEvent):
+    with _get_user_lock(event.source.user_id):
+        _handle_message(event)
+
+
+def _handle_message(event: MessageEvent):
     start_time = time.time()
     message_text = event.message.text.strip()
     user_id = event.source.user_id
@@ -322,6 +345,11 @@ def handle_message(event: MessageEvent):
 @handler.add(FollowEvent)
 def handle_follow(event: FollowEvent):
     """Handle when a user adds the bot as a friend"""
+    with _get_user_lock(event.source.user_id):
+        _handle_follow(event)
+
+
+def _handle_follow(event: FollowEvent):
     user_id = event.source.user_id
     
     # Get user profile information
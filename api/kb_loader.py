@@ -0,0 +1,137 @@
+"""
+Shared lookup for the bundled data files (kb.json etc.)
+Resolves the file location once per process for the different deployment environments
+and parses kb.json once per file version for every module that reads it
+"""
+import functools
+import json
+import os
+import sys
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+DEFAULT_KB_FILE = "data/kb.json"
+# Resolved locations; misses aren't stored so a file added later is still found
+_found_paths: Dict[str, str] = {}
+
+
+def find_data_file(relative_path: str) -> Optional[str]:
+    """
+    Find a data file such as "data/kb.json" (relative to the api package)
+    Returns the first existing path, or None if the file can't be found
+    """
+    full_path = _found_paths.get(relative_path)
+    if full_path is None:
+        full_path = _search_data_file(relative_path)
+        if full_path:
+            _found_paths[relative_path] = full_path
+    return full_path
+
+
+def _search_data_file(relative_path: str) -> Optional[str]:
+    """Search the candidate base directories for a data file"""
+    if os.path.isabs(relative_path):
+        return relative_path if os.path.isfile(relative_path) else None
+
+    # Remove 'api/' prefix if present
+    if relative_path.startswith('api/'):
+        relative_path = relative_path[len('api/'):]
+
+    directory, filename = os.path.split(relative_path)
+
+    # Try different base directories
+    base_dirs = [
+        os.path.dirname(os.path.abspath(__file__)),  # Current module directory
+        os.getcwd(),  # Current working directory
+        os.path.join(os.getcwd(), 'api'),  # api subdirectory of working directory
+    ]
+
+    # Several candidates usually point at the same directory (e.g. module dir == cwd/api)
+    seen = set()
+    for base_dir in base_dirs:
+        for prefix in ('', 'api'):
+            search_dir = os.path.realpath(os.path.join(base_dir, prefix, directory))
+            if search_dir in seen:
+                continue
+            seen.add(search_dir)
+            full_path = _find_in_directory(search_dir, filename)
+            if full_path:
+                return full_path
+
+    return None
+
+
+def _find_in_directory(directory: str, filename: str) -> Optional[str]:
+    """
+    Look up filename in one directory listing, ignoring case
+    (e.g. KB.json on Render); an exact-case match wins
+    """
+    wanted = filename.lower()
+    fallback = None
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.lower() != wanted or not entry.is_file():
+                    continue
+                if entry.name == filename:
+                    return entry.path
+                fallback = fallback or entry.path
+    except OSError:
+        return None
+    return fallback
+
+
+def load_kb(relative_path: str = DEFAULT_KB_FILE) -> Mapping[str, str]:
+    """
+    Load kb.json as a read-only {キー: 値} mapping, parsed once until the file changes
+    Raises FileNotFoundError if the file can't be found
+    """
+    full_path = _require_data_file(relative_path)
+    return _build_kb_mapping(full_path, os.path.getmtime(full_path))
+
+
+def load_kb_entries(relative_path: str = DEFAULT_KB_FILE) -> Tuple[Mapping[str, str], ...]:
+    """
+    Load the kb.json entries as read-only rows, parsed once until the file changes
+    Raises FileNotFoundError if the file can't be found
+    """
+    full_path = _require_data_file(relative_path)
+    return _parse_kb(full_path, os.path.getmtime(full_path))
+
+
+def _require_data_file(relative_path: str) -> str:
+    """Resolve a data file, raising FileNotFoundError if it can't be found"""
+    full_path = find_data_file(relative_path)
+    if not full_path:
+        raise FileNotFoundError(f"Could not find {relative_path}")
+    return full_path
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_kb(full_path: str, mtime: float) -> Tuple[Mapping[str, str], ...]:
+    """Parse a kb.json file; the mtime is only part of the cache key"""
+    with open(full_path, 'rb') as f:
+        raw = f.read()
+    kb_list = orjson.loads(raw) if orjson else json.loads(raw)
+    # Shared by every caller (and thread), so hand out read-only rows
+    return tuple(MappingProxyType(item) for item in kb_list)
+
+
+@functools.lru_cache(maxsize=4)
+def _build_kb_mapping(full_path: str, mtime: float) -> Mapping[str, str]:
+    """Build the {キー: 値} mapping from the parsed entries"""
+    # Convert list of dicts to simple key-value mapping
+    kb_dict = {}
+    for item in _parse_kb(full_path, mtime):
+        key = item.get('キー', '')
+        value = item.get('値', '')
+        if key and value:
+            # Interned keys are shared by every lookup table built from the KB
+            kb_dict[sys.intern(key)] = value
+    # Shared by every caller (and thread), so hand out a read-only view
+    return MappingProxyType(kb_dict)
@@ -2,80 +2,285 @@
 RAG-FAQ system using FAISS for semantic search
 Simplified approach with vector similarity search
 """
-import json
+import functools
+import hashlib
+import logging
+import math
 import os
 import re
+import threading
 import numpy as np
 import faiss
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Mapping, Optional
+
+# Single-query encodes gain nothing from tokenizer threads, which also warn/deadlock after a fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
 from sentence_transformers import SentenceTransformer
+from api.kb_loader import load_kb
+
+logger = logging.getLogger(__name__)
+
+# Keywords for queries that need human guidance
+_DANGEROUS_KEYWORDS = (
+    "薬", "薬剤", "治療", "診断", "病気", "症状", "副作用",
+    "アレルギー", "妊娠", "授乳", "医療", "医師", "病院",
+    "競合", "他店", "安く", "値下げ", "割引"
+)
+# One alternation scans the query once instead of once per keyword
+_DANGEROUS_PATTERN = re.compile('|'.join(map(re.escape, _DANGEROUS_KEYWORDS)))
+
+# Characters/particles allowed right before a KB key for a standalone match
+_ALLOWED_PRECEDING = frozenset({
+    '', ' ', '　', '、', '。', '(', '（', '[', '「', '『', '/', '-', '・', '+', '&',
+    'は', 'が', 'を', 'で', 'に', 'と', 'へ', 'も', 'や', 'の', 'より', 'から'
+})
+
+# Response templates by KB key substring, checked in order (first match wins)
+_RESPONSE_TEMPLATES = (
+    (('店名',), "店名は「{value}」です。"),
+    (('住所',), "住所は「{value}」です。"),
+    (('電話番号',), "お電話番号は「{value}」までお願いいたします。"),
+    (('アクセス',), "アクセスは「{value}」です。"),
+    (('営業時間平日',), "平日の営業時間は「{value}」です。"),
+    (('営業時間土日祝', '営業時間土日'), "土日祝の営業時間は「{value}」です。"),
+    (('営業時間',), "営業時間は「{value}」です。"),
+    (('定休日',), "定休日は「{value}」です。"),
+    (('駐車場',), "駐車場は「{value}」です。"),
+    (('支払い',), "支払い方法は「{value}」です。"),
+    (('変更',), "予約変更について：{value}"),
+    (('キャンセル',), "キャンセル規定は「{value}」です。"),
+    (('指名料',), "指名料は「{value}」です。"),
+    (('追加料金',), "追加料金について：{value}"),
+    (('紹介割',), "紹介割引について：{value}"),
+    (('仕上がり保証',), "仕上がり保証について：{value}"),
+    (('カット', 'カラー', 'パーマ', 'トリートメント'), "{key}は「{value}」です。"),
+    (('クーポン', '特典', '割引'), "{key}について：{value}"),
+    (('アレルギー', '妊娠'), "安全のため、{value}。直接お問い合わせください。"),
+    (('sns',), "SNSアカウントは「{value}」です。"),
+)
+_DEFAULT_RESPONSE_TEMPLATE = "{value}です。"
+
+# Synonym prefixes for the embedded KB texts, checked in order (first match wins):
+# (alternative groups of substrings that must all appear, substrings that rule the prefix out, prefix)
+_CONTEXT_PREFIXES = (
+    ((('住所',),), (), "住所 場所 所在地 どこ 位置 アドレス どこに どの辺り"),
+    ((('営業時間平日',),), (), "営業時間 時間 開店 閉店 平日 何時 いつ"),
+    ((('営業時間土日祝',), ('営業時間土日',)), (), "営業時間 時間 開店 閉店 土日 週末 祝日 土曜 日曜 休日 何時 いつ"),
+    ((('駐車場',),), (), "駐車場 パーキング 車 駐車 車で 駐輪"),
+    ((('支払い',),), (), "支払い 支払 決済 現金 クレジット お支払い 支払方法"),
+    ((('変更',),), ('予約',), "変更 予約変更 時間変更 日付変更 変更する 変更したい 予約の変更"),
+    ((('予約',),), (), "予約 予約方法 予約する 予約したい 予約できますか"),
+    ((('キャンセル',),), (), "キャンセル 取消 取り消し キャンセルしたい 予約キャンセル"),
+    ((('指名料',), ('指名', '料金')), (), "指名料 指名 指名料金 指名する 指名の料金 料金"),
+    ((('追加料金',), ('追加', '料金')), (), "追加料金 追加 料金 オプション 追加費用 プラス 加算"),
+    ((('紹介割',), ('紹介', '割')), (), "紹介割 紹介 紹介割引 紹介する 紹介者 割引 特典"),
+    ((('仕上がり保証',), ('仕上がり', '保証')), (), "仕上がり保証 保証 お直し 仕上がり 保証期間 無償"),
+    ((('カット',), ('カラー',), ('パーマ',), ('トリートメント',)), (), "メニュー 料金 価格 値段 サービス いくら 何円 金額 費用"),
+    ((('クーポン',), ('特典',), ('割引',)), (), "割引 特典 クーポン キャンペーン お得"),
+    ((('sns',),), (), "SNS ソーシャル 公式 アカウント LINE Instagram"),
+)
+
+# Categories by KB key substring, checked in order (first match wins)
+_CATEGORY_RULES = (
+    (('店名', '住所', '電話番号'), '基本情報'),
+    (('アクセス', '駐車場'), 'アクセス'),
+    (('営業時間', '定休日'), '営業時間'),
+    (('支払い',), '支払い'),
+    (('変更',), '予約変更'),
+    (('予約', 'キャンセル'), '予約'),
+    (('指名料', '追加料金'), '料金'),
+    (('紹介割', 'クーポン', '特典'), '割引・特典'),
+    (('仕上がり保証',), '保証'),
+    (('カット', 'カラー', 'パーマ', 'トリートメント'), 'メニュー・料金'),
+    (('アレルギー', '妊娠'), '安全'),
+    (('sns',), 'SNS'),
+)
+
+DEFAULT_KB_PATH = "api/data/kb.json"
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+QUERY_CACHE_SIZE = 1024
+# Dynamically quantized (QInt8 MatMul) ONNX export in the model repository
+ONNX_QUANTIZED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+# Shorter queries (after stripping) can't match a KB entry meaningfully
+MIN_QUERY_LENGTH = 2
+# Below this many KB entries a plain NumPy matmul is faster than a FAISS search call
+EXACT_SEARCH_MAX_ENTRIES = 256
+# From this many KB entries an IVF index searches only nearby clusters instead of every vector
+IVF_MIN_ENTRIES = 2048
+IVF_NPROBE = 8
+# Webhooks are handled concurrently in worker threads, so by default each encode/search uses
+# one thread instead of every request starting a thread per core (oversubscription)
+DEFAULT_NUM_THREADS = 1
+EMBEDDING_CACHE_DIR = os.getenv(
+    "RAG_EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache")
+)
+# Serializes model loading so concurrent first searches share one load
+_MODEL_LOCK = threading.Lock()
+
+
+def _find_response_template(key: str) -> str:
+    """Pick the response template for a KB key from _RESPONSE_TEMPLATES"""
+    # Rules are matched against the lowercased key so 'SNS'/'sns' both hit
+    folded_key = key.lower()
+    for substrings, template in _RESPONSE_TEMPLATES:
+        if any(substring in folded_key for substring in substrings):
+            return template
+    
+    # Generic response for other keys
+    return _DEFAULT_RESPONSE_TEMPLATE
+
+
+def _find_context_prefix(key: str) -> str:
+    """Pick the synonym prefix for a KB key's embedded text from _CONTEXT_PREFIXES"""
+    folded_key = key.lower()
+    for groups, excluded, prefix in _CONTEXT_PREFIXES:
+        if any(excluded_substring in folded_key for excluded_substring in excluded):
+            continue
+        if any(all(substring in folded_key for substring in group) for group in groups):
+            return prefix
+    return ''
+
+
+def _find_category(key: str) -> str:
+    """Pick the category for a KB key from _CATEGORY_RULES"""
+    folded_key = key.lower()
+    for substrings, category in _CATEGORY_RULES:
+        if any(substring in folded_key for substring in substrings):
+            return category
+    return 'その他'
+
+
+def _normalize_for_match(text: str) -> str:
+    """Normalize full-width separators and case for standalone key matching"""
+    return text.replace('＋', '+').replace('＆', '&').lower()
+
+
+def _num_threads_from_env() -> int:
+    """CPU thread count from TORCH_NUM_THREADS, falling back to DEFAULT_NUM_THREADS if unset or invalid"""
+    value = os.getenv("TORCH_NUM_THREADS")
+    if not value:
+        return DEFAULT_NUM_THREADS
+    try:
+        num_threads = int(value)
+    except ValueError:
+        num_threads = 0
+    if num_threads < 1:
+        logger.warning("Ignoring invalid TORCH_NUM_THREADS=%r; using %d", value, DEFAULT_NUM_THREADS)
+        return DEFAULT_NUM_THREADS
+    return num_threads
+
+
+NUM_THREADS = _num_threads_from_env()
+faiss.omp_set_num_threads(NUM_THREADS)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_shared_model(backend: str, device: Optional[str], quantize: bool):
+    """
+    Load the embedding model once per process and configuration
+    Returns (model, variant), where the variant identifies the embeddings it produces
+    """
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(NUM_THREADS)
+    model_kwargs = None
+    if quantize and backend == "onnx":
+        # Load the int8 ONNX export published with the model instead of the fp32 one
+        model_kwargs = {"file_name": ONNX_QUANTIZED_FILE}
+    model = SentenceTransformer(MODEL_NAME, backend=backend, device=device, model_kwargs=model_kwargs)
+    if quantize and backend == "torch" and model.device.type == "cpu":
+        _quantize_model(model)
+    else:
+        quantize = model_kwargs is not None
+    return model, f"{MODEL_NAME}/{backend}/{'int8' if quantize else 'fp32'}"
+
+
+def _quantize_model(model):
+    """Swap the model's Linear layers for dynamic int8 ones (CPU inference only)"""
+    import torch
+    torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    logger.info("Embedding model quantized to int8")
+
 
 class RAGFAQ:
-    def __init__(self, kb_data_path: str = "api/data/kb.json"):
+    def __init__(self, kb_data_path: str = DEFAULT_KB_PATH):
         self.kb_data = self._load_kb_data(kb_data_path)
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # The model and index are only needed for semantic search; built on first use
+        self.model = None
+        self._model_variant = None
+        self._index_lock = threading.Lock()
+        self._index_ready = False
         self.index = None
+        self._kb_embeddings = None
         self.kb_keys = []
         self.combo_keys = []
-        self._build_faiss_index()
+        self._normalized_keys = {}
+        self._any_key_pattern = None
+        self._kb_items_by_length = []
+        self._response_templates = {}
+        self._categories = {}
+        self._build_key_matcher()
+        self._build_response_templates()
+        self._build_categories()
+        # Repeated questions reuse their embedding instead of re-running the model
+        self._encode_query = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
+        # Repeated (query, threshold) pairs skip the search and response building entirely
+        self._search_cached = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._search_uncached)
+    
+    def _ensure_index(self):
+        """Load the embedding model and build the index once, on the first semantic search"""
+        if self._index_ready:
+            return
+        with self._index_lock:
+            if self._index_ready:
+                return
+            self._load_model()
+            self._build_faiss_index()
+            self._index_ready = True
     
-    def _load_kb_data(self, path: str) -> Dict[str, str]:
+    def _load_model(self):
+        """Load (or reuse) the sentence-transformers model configured by the RAG_MODEL_* env vars"""
+        # torch (default), onnx or openvino; onnx/openvino need sentence-transformers[onnx]/[openvino]
+        backend = os.getenv("RAG_MODEL_BACKEND", "torch")
+        # cpu, cuda, mps...; unset lets sentence-transformers pick the best available device
+        device = os.getenv("RAG_MODEL_DEVICE") or None
+        quantize = os.getenv("RAG_MODEL_QUANTIZE", "false").lower() == "true"
+        with _MODEL_LOCK:
+            self.model, self._model_variant = _load_shared_model(backend, device, quantize)
+    
+    def _load_kb_data(self, path: str) -> Mapping[str, str]:
         """Load KB data from JSON file and return simple key-value mapping"""
         try:
-            # Try multiple possible paths for different deployment environments
-            possible_paths = []
-            
-            if os.path.isabs(path):
-                possible_paths.append(path)
-            else:
-                # Remove 'api/' prefix if present
-                clean_path = path.replace('api/', '')
-                
-                # Try different base directories
-                base_dirs = [
-                    os.path.dirname(os.path.abspath(__file__)),  # Current module directory
-                    os.getcwd(),  # Current working directory
-                    os.path.join(os.getcwd(), 'api'),  # api subdirectory of working directory
-                ]
-                
-                for base_dir in base_dirs:
-                    possible_paths.append(os.path.join(base_dir, clean_path))
-                    possible_paths.append(os.path.join(base_dir, path))
-                    # Try with uppercase KB.json (for Render deployment)
-                    if 'kb.json' in clean_path:
-                        possible_paths.append(os.path.join(base_dir, clean_path.replace('kb.json', 'KB.json')))
-                    if 'kb.json' in path:
-                        possible_paths.append(os.path.join(base_dir, path.replace('kb.json', 'KB.json')))
-            
-            # Try each possible path
-            for full_path in possible_paths:
-                try:
-                    if not os.path.exists(full_path) or not os.path.isfile(full_path):
-                        continue
-                    
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        kb_list = json.load(f)
-                    
-                    # Convert list of dicts to simple key-value mapping
-                    kb_dict = {}
-                    for item in kb_list:
-                        key = item.get('キー', '')
-                        value = item.get('値', '')
-                        if key and value:
-                            kb_dict[key] = value
-                    
-                    return kb_dict
-                except (FileNotFoundError, OSError, json.JSONDecodeError):
-                    continue
-            
-            # If none of the paths worked, return empty dict
+            return load_kb(path)
+        except FileNotFoundError:
             print(f"Warning: Could not load KB data from {path}")
             return {}
-            
         except Exception as e:
             print(f"Error loading KB data from {path}: {e}")
             return {}
     
+    def _build_key_matcher(self):
+        """Precompute the normalized KB keys and the pattern matching any of them"""
+        self._normalized_keys = {key: _normalize_for_match(key) for key in self.kb_data}
+        # All keys as one lookahead alternation in search_origin's priority order (longest first):
+        # at every query position it reports the highest-priority key starting there
+        prioritized_keys = sorted(self.kb_data, key=len, reverse=True)
+        self._kb_items_by_length = [(key, self.kb_data[key]) for key in prioritized_keys]
+        self._any_key_pattern = re.compile(
+            '(?=(' + '|'.join(re.escape(self._normalized_keys[key]) for key in prioritized_keys) + '))'
+        )
+    
+    def _build_response_templates(self):
+        """Resolve each KB key's response template once instead of on every answer"""
+        self._response_templates = {key: _find_response_template(key) for key in self.kb_data}
+    
+    def _build_categories(self):
+        """Resolve each KB key's category once instead of on every hit"""
+        self._categories = {key: _find_category(key) for key in self.kb_data}
+    
     def _build_faiss_index(self):
         """Build FAISS index for semantic search"""
         if not self.kb_data:
@@ -88,38 +293,8 @@ class RAGFAQ:
         
         for key, value in self.kb_data.items():
             # Create contextual text for better semantic matching
-            if '住所' in key:
-                text = f"住所 場所 所在地 どこ 位置 アドレス どこに どの辺り {key} {value}"
-            elif '営業時間平日' in key:
-                text = f"営業時間 時間 開店 閉店 平日 何時 いつ {key} {value}"
-            elif '営業時間土日祝' in key or '営業時間土日' in key:
-                text = f"営業時間 時間 開店 閉店 土日 週末 祝日 土曜 日曜 休日 何時 いつ {key} {value}"
-            elif '駐車場' in key:
-                text = f"駐車場 パーキング 車 駐車 車で 駐輪 {key} {value}"
-            elif '支払い' in key:
-                text = f"支払い 支払 決済 現金 クレジット お支払い 支払方法 {key} {value}"
-            elif '変更' in key and '予約' not in key:
-                text = f"変更 予約変更 時間変更 日付変更 変更する 変更したい 予約の変更 {key} {value}"
-            elif '予約' in key:
-                text = f"予約 予約方法 予約する 予約したい 予約できますか {key} {value}"
-            elif 'キャンセル' in key:
-                text = f"キャンセル 取消 取り消し キャンセルしたい 予約キャンセル {key} {value}"
-            elif '指名料' in key or ('指名' in key and '料金' in key):
-                text = f"指名料 指名 指名料金 指名する 指名の料金 料金 {key} {value}"
-            elif '追加料金' in key or ('追加' in key and '料金' in key):
-                text = f"追加料金 追加 料金 オプション 追加費用 プラス 加算 {key} {value}"
-            elif '紹介割' in key or ('紹介' in key and '割' in key):
-                text = f"紹介割 紹介 紹介割引 紹介する 紹介者 割引 特典 {key} {value}"
-            elif '仕上がり保証' in key or ('仕上がり' in key and '保証' in key):
-                text = f"仕上がり保証 保証 お直し 仕上がり 保証期間 無償 {key} {value}"
-            elif 'カット' in key or 'カラー' in key or 'パーマ' in key or 'トリートメント' in key:
-                text = f"メニュー 料金 価格 値段 サービス いくら 何円 金額 費用 {key} {value}"
-            elif 'クーポン' in key or '特典' in key or '割引' in key:
-                text = f"割引 特典 クーポン キャンペーン お得 {key} {value}"
-            elif 'SNS' in key or 'sns' in key.lower():
-                text = f"SNS ソーシャル 公式 アカウント LINE Instagram {key} {value}"
-            else:
-                text = f"{key} {value}"
+            prefix = _find_context_prefix(key)
+            text = ' '.join((prefix, key, value) if prefix else (key, value))
             
             texts.append(text)
             self.kb_keys.append(key)
@@ -130,39 +305,137 @@ class RAGFAQ:
             #     if parts:
             #         self.combo_keys.append({'key': key, 'parts': parts})
         
-        print("texts: ", texts)
+        logger.debug("texts: %s", texts)
 
-        # Generate embeddings
-        embeddings = self.model.encode(texts)
-        print("embeddings: ", embeddings)
+        # Reuse embeddings from a previous start if the KB texts and model are unchanged
+        cache_path = self._embedding_cache_path(texts)
+        embeddings = self._load_cached_embeddings(cache_path)
+        if embeddings is None:
+            # Generate embeddings in one batched call, normalized for cosine similarity
+            embeddings = self.model.encode(
+                texts,
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            self._save_cached_embeddings(cache_path, embeddings)
+        logger.debug("embeddings: %s", embeddings)
         
-        # Create FAISS index
+        embeddings = embeddings.astype(np.float32, copy=False)
+        if len(embeddings) < EXACT_SEARCH_MAX_ENTRIES:
+            self._kb_embeddings = embeddings
+        else:
+            self.index = self._create_index(embeddings)
+        logger.debug("index: %s", self.index)
+    
+    def _create_index(self, embeddings: np.ndarray):
+        """Create a FAISS inner-product index (cosine similarity on normalized vectors)"""
         dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
-        self.index.add(embeddings.astype('float32'))
-        print("index: ", self.index)
+        # fp16 scalar quantization: half the float32 storage, scores within ~1e-3 of exact
+        if len(embeddings) < IVF_MIN_ENTRIES:
+            index = faiss.index_factory(dimension, "SQfp16", faiss.METRIC_INNER_PRODUCT)
+        else:
+            # Only probe the nearest clusters; sqrt(N) lists keeps enough points per list to train
+            nlist = int(math.sqrt(len(embeddings)))
+            index = faiss.index_factory(dimension, f"IVF{nlist},SQfp16", faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = IVF_NPROBE
+        index.train(embeddings)
+        index.add(embeddings)
+        return index
+    
+    def _top_matches(self, query_embedding: np.ndarray, k: int):
+        """Top-k (scores, indices) in FAISS's (1, k) layout, from the matrix or the index"""
+        if self._kb_embeddings is None:
+            return self.index.search(query_embedding.astype(np.float32, copy=False), k)
+        similarities = self._kb_embeddings @ query_embedding[0]
+        if k == 1:
+            top = np.array([similarities.argmax()])
+        else:
+            top = np.argsort(-similarities, kind='stable')[:k]
+        return similarities[top][None, :], top[None, :]
+    
+    def _embedding_cache_path(self, texts) -> str:
+        """Cache file name keyed by the model variant and every KB text"""
+        digest = hashlib.sha256()
+        digest.update(self._model_variant.encode('utf-8'))
+        for text in texts:
+            digest.update(b'\0' + text.encode('utf-8'))
+        return os.path.join(EMBEDDING_CACHE_DIR, f"kb_embeddings_{digest.hexdigest()[:16]}.npy")
+    
+    def _load_cached_embeddings(self, path: str) -> Optional[np.ndarray]:
+        """Memory-map previously saved KB embeddings, or None on a cache miss"""
+        if not os.path.isfile(path):
+            logger.info("No KB embedding cache at %s", path)
+            return None
+        try:
+            embeddings = np.load(path, mmap_mode='r')
+            logger.info("Loaded KB embeddings from cache: %s", path)
+            return embeddings
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read embedding cache %s: %s", path, e)
+            return None
+    
+    def _save_cached_embeddings(self, path: str, embeddings: np.ndarray):
+        """Persist normalized KB embeddings; failures only cost a re-encode next start"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, embeddings)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write embedding cache %s: %s", path, e)
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Encode and L2-normalize a single query (memoized per instance in __init__)"""
+        query_embedding = self.model.encode(
+            [query], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+        )
+        # Shared between cache hits, so make sure nobody modifies it in place
+        query_embedding.setflags(write=False)
+        return query_embedding
     
     def search(self, query: str, threshold: float = 0.3, depth: int = 0) -> Optional[Dict[str, Any]]:
         """
         Search using FAISS semantic similarity
         Returns None if no good match found
         """
-        if not self.index or not self.kb_data:
+        # A KB key spelled out in the query answers it without running the model
+        exact_match = self.search_origin(query)
+        if exact_match is not None:
+            return exact_match
+        
+        # Nothing to match against; don't load the model for an empty KB
+        if not self.kb_data:
+            return None
+        
+        # Skip the model for empty/one-character/punctuation-only messages
+        stripped_query = query.strip()
+        if len(stripped_query) < MIN_QUERY_LENGTH or not any(ch.isalnum() for ch in stripped_query):
+            return None
+        
+        self._ensure_index()
+        result = self._search_cached(query, threshold)
+        if result is None:
+            return None
+        # Hand out a copy so callers can't modify the cached result
+        return dict(result, kb_facts=dict(result['kb_facts']))
+    
+    def _search_uncached(self, query: str, threshold: float) -> Optional[Dict[str, Any]]:
+        """Semantic search itself (memoized per instance in __init__)"""
+        if self.index is None and self._kb_embeddings is None:
             return None
         
         # Generate query embedding
-        query_embedding = self.model.encode([query])
-        faiss.normalize_L2(query_embedding)
+        query_embedding = self._encode_query(query)
         
-        k = len(self.kb_keys)
-        scores, indices = self.index.search(query_embedding.astype('float32'), k)
-        print("scores: ", scores)
-        print("indices: ", indices)
-        print("len(indices[0]): ", len(indices[0]))
-        print("scores[0][0]: ", scores[0][0])
+        # Only the best match is used
+        scores, indices = self._top_matches(query_embedding, 1)
+        logger.debug("scores: %s", scores)
+        logger.debug("indices: %s", indices)
+        logger.debug("len(indices[0]): %s", len(indices[0]))
+        logger.debug("scores[0][0]: %s", scores[0][0])
 
         best_idx = None
         best_key = None
@@ -174,8 +447,8 @@ class RAGFAQ:
             best_key = self.kb_keys[best_idx]
             best_score = float(scores[0][0])
             kb_value = self.kb_data.get(best_key)
-            print("best_key: ", best_key)
-            print("kb_value: ", kb_value)
+            logger.debug("best_key: %s", best_key)
+            logger.debug("kb_value: %s", kb_value)
             
         #     # Check if query contains specific keywords that should match certain KB keys
         #     # This helps with exact keyword matching for better accuracy
@@ -331,117 +604,35 @@ class RAGFAQ:
 
     def _create_response(self, key: str, value: str, query: str) -> str:
         """Create natural Japanese response based on KB data"""
-        # Create contextual responses based on the type of information
-        if '店名' in key:
-            return f"店名は「{value}」です。"
-        elif '住所' in key:
-            return f"住所は「{value}」です。"
-        elif '電話番号' in key:
-            return f"お電話番号は「{value}」までお願いいたします。"
-        elif 'アクセス' in key:
-            return f"アクセスは「{value}」です。"
-        elif '営業時間平日' in key:
-            return f"平日の営業時間は「{value}」です。"
-        elif '営業時間土日祝' in key or '営業時間土日' in key:
-            return f"土日祝の営業時間は「{value}」です。"
-        elif '営業時間' in key:
-            return f"営業時間は「{value}」です。"
-        elif '定休日' in key:
-            return f"定休日は「{value}」です。"
-        elif '駐車場' in key:
-            return f"駐車場は「{value}」です。"
-        elif '支払い' in key:
-            return f"支払い方法は「{value}」です。"
-        elif '変更' in key:
-            return f"予約変更について：{value}"
-        elif 'キャンセル' in key:
-            return f"キャンセル規定は「{value}」です。"
-        elif '指名料' in key:
-            return f"指名料は「{value}」です。"
-        elif '追加料金' in key:
-            return f"追加料金について：{value}"
-        elif '紹介割' in key:
-            return f"紹介割引について：{value}"
-        elif '仕上がり保証' in key:
-            return f"仕上がり保証について：{value}"
-        elif 'カット' in key or 'カラー' in key or 'パーマ' in key or 'トリートメント' in key:
-            return f"{key}は「{value}」です。"
-        elif 'クーポン' in key or '特典' in key or '割引' in key:
-            return f"{key}について：{value}"
-        elif 'アレルギー' in key or '妊娠' in key:
-            return f"安全のため、{value}。直接お問い合わせください。"
-        elif 'SNS' in key or 'sns' in key.lower():
-            return f"SNSアカウントは「{value}」です。"
-        else:
-            # Generic response for other keys
-            return f"{value}です。"
+        template = self._response_templates.get(key)
+        if template is None:
+            template = _find_response_template(key)
+        return template.format(key=key, value=value)
     
     def _get_category(self, key: str) -> str:
         """Get category for KB key"""
-        if '店名' in key or '住所' in key or '電話番号' in key:
-            return '基本情報'
-        elif 'アクセス' in key or '駐車場' in key:
-            return 'アクセス'
-        elif '営業時間' in key or '定休日' in key:
-            return '営業時間'
-        elif '支払い' in key:
-            return '支払い'
-        elif '変更' in key:
-            return '予約変更'
-        elif '予約' in key or 'キャンセル' in key:
-            return '予約'
-        elif '指名料' in key or '追加料金' in key:
-            return '料金'
-        elif '紹介割' in key or 'クーポン' in key or '特典' in key:
-            return '割引・特典'
-        elif '仕上がり保証' in key:
-            return '保証'
-        elif 'カット' in key or 'カラー' in key or 'パーマ' in key or 'トリートメント' in key:
-            return 'メニュー・料金'
-        elif 'アレルギー' in key or '妊娠' in key:
-            return '安全'
-        elif 'SNS' in key or 'sns' in key.lower():
-            return 'SNS'
-        else:
-            return 'その他'
+        category = self._categories.get(key)
+        if category is None:
+            category = _find_category(key)
+        return category
     
     def _is_dangerous_query(self, query: str) -> bool:
         """Check if query is in dangerous areas that need human guidance"""
-        dangerous_keywords = [
-            "薬", "薬剤", "治療", "診断", "病気", "症状", "副作用",
-            "アレルギー", "妊娠", "授乳", "医療", "医師", "病院",
-            "競合", "他店", "安く", "値下げ", "割引"
-        ]
-        
-        return any(keyword in query for keyword in dangerous_keywords)
+        return _DANGEROUS_PATTERN.search(query) is not None
 
-    def _contains_key_as_standalone(self, query: str, key: str) -> bool:
+    def _find_standalone_keys(self, normalized_query: str) -> set:
         """
-        Check if key appears in query as a standalone term or separated by typical particles,
-        preventing matches when the key is embedded within another word (e.g., 前髪カット vs カット).
+        Normalized KB keys that occur in the query as standalone terms, keeping only
+        the highest-priority key at each position. A key is standalone at the start of
+        the query or after a separator/particle, not when embedded in another word
+        (e.g. 前髪カット doesn't match カット). The query must already be normalized.
         """
-        if not key:
-            return False
-
-        normalized_query = query.replace('＋', '+').replace('＆', '&').lower()
-        normalized_key = key.replace('＋', '+').replace('＆', '&').lower()
-
-        allowed_preceding = {
-            '', ' ', '　', '、', '。', '(', '（', '[', '「', '『', '/', '-', '・', '+', '&',
-            'は', 'が', 'を', 'で', 'に', 'と', 'へ', 'も', 'や', 'の', 'より', 'から'
-        }
-
-        for match in re.finditer(re.escape(normalized_key), normalized_query):
+        found = set()
+        for match in self._any_key_pattern.finditer(normalized_query):
             idx = match.start()
-
-            if idx == 0:
-                return True
-
-            preceding_char = normalized_query[idx - 1]
-            if preceding_char in allowed_preceding:
-                return True
-
-        return False
+            if idx == 0 or normalized_query[idx - 1] in _ALLOWED_PRECEDING:
+                found.add(match.group(1))
+        return found
 
     def search_origin(self, query: str) -> Optional[Dict[str, Any]]:
         """
@@ -451,11 +642,17 @@ class RAGFAQ:
         if not self.kb_data or not query:
             return None
 
-        # Prioritize longer keys first to avoid matching generic terms before specific ones
-        kb_items = sorted(self.kb_data.items(), key=lambda item: len(item[0]), reverse=True)
+        # Normalize the query once instead of once per KB key
+        normalized_query = _normalize_for_match(query)
 
-        for key, value in kb_items:
-            if self._contains_key_as_standalone(query, key):
+        # One scan over the query instead of one substring test per KB key
+        standalone_keys = self._find_standalone_keys(normalized_query)
+        if not standalone_keys:
+            return None
+
+        # Prioritize longer keys first to avoid matching generic terms before specific ones
+        for key, value in self._kb_items_by_length:
+            if self._normalized_keys[key] in standalone_keys:
                 response = self._create_response(key, value, query)
                 return {
                     'kb_key': key,
@@ -496,4 +693,10 @@ class RAGFAQ:
         Returns None if not found in KB
         """
         # return self.search(user_message, threshold=0.4)
-        return self.search_origin(user_message)
\ No newline at end of file
+        return self.search_origin(user_message)
+
+
+@functools.lru_cache(maxsize=None)
+def get_ragfaq(kb_data_path: str = DEFAULT_KB_PATH) -> RAGFAQ:
+    """Process-wide RAGFAQ so the model and index are loaded once"""
+    return RAGFAQ(kb_data_path)
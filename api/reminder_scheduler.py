@@ -3,16 +3,24 @@ Scheduler for running daily reminder tasks
 Runs at 9:00 AM daily to send reservation reminders
 """
 import os
-import time
+import re
+import threading
 import logging
 from datetime import datetime, timedelta
+import pytz
 from dotenv import load_dotenv
+from api.kb_loader import load_kb_entries
+
+# HH:MM inside the reminder time text (e.g. "来店前日 09:00 自動配信")
+_TIME_RE = re.compile(r'(\d{2}):(\d{2})')
+_TOKYO_TZ = pytz.timezone('Asia/Tokyo')
 
 class ReminderScheduler:
     def __init__(self):
         load_dotenv()
         self.enabled = os.getenv("REMINDER_SCHEDULER_ENABLED", "true").lower() == "true"
         self.timezone = os.getenv("TIMEZONE", "Asia/Tokyo")
+        self._stop_event = threading.Event()
         
         if self.enabled:
             print("Reminder scheduler enabled")
@@ -23,45 +31,8 @@ class ReminderScheduler:
     def _load_kb_data(self):
         """Load data from kb.json file"""
         try:
-            import json
-            
-            # Try multiple possible paths for different deployment environments
-            possible_paths = []
-            
-            # Try different base directories
-            base_dirs = [
-                os.path.dirname(os.path.abspath(__file__)),  # Current module directory
-                os.getcwd(),  # Current working directory
-                os.path.join(os.getcwd(), 'api'),  # api subdirectory of working directory
-            ]
-            
-            for base_dir in base_dirs:
-                possible_paths.append(os.path.join(base_dir, "data", "kb.json"))
-                possible_paths.append(os.path.join(base_dir, "api", "data", "kb.json"))
-                # Try with uppercase KB.json (for Render deployment)
-                possible_paths.append(os.path.join(base_dir, "data", "KB.json"))
-                possible_paths.append(os.path.join(base_dir, "api", "data", "KB.json"))
-            
-            # Try each possible path
-            for kb_file in possible_paths:
-                try:
-                    with open(kb_file, 'r', encoding='utf-8') as f:
-                        kb_data = json.load(f)
-                    
-                    # Convert array format to dictionary
-                    kb_dict = {}
-                    for item in kb_data:
-                        key = item.get('キー', '')
-                        value = item.get('例（置換値）', '')
-                        kb_dict[key] = value
-                    
-                    return kb_dict
-                except (FileNotFoundError, OSError):
-                    continue
-            
-            # If none of the paths worked, raise an error
-            raise FileNotFoundError(f"Could not find kb.json file. Tried paths: {possible_paths}")
-            
+            # Reminders read the '例（置換値）' column of the shared entries
+            return {item.get('キー', ''): item.get('例（置換値）', '') for item in load_kb_entries()}
         except Exception as e:
             logging.error(f"Error loading kb.json: {e}")
             return {}
@@ -72,14 +43,11 @@ class ReminderScheduler:
         kb_data = self._load_kb_data()
         remind_time = kb_data.get('REMIND_TIME', '来店前日 09:00 自動配信')
         
-        import pytz
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
-        current_tokyo_time = datetime.now(tokyo_tz)
+        current_tokyo_time = datetime.now(_TOKYO_TZ)
         print(f"Current Tokyo time: {current_tokyo_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # Extract time from the string (e.g., "来店前日 09:00 自動配信" -> "09:00")
-        import re
-        time_match = re.search(r'(\d{2}):(\d{2})', remind_time)
+        time_match = _TIME_RE.search(remind_time)
         if time_match:
             schedule_time = f"{time_match.group(1)}:{time_match.group(2)}"
         else:
@@ -121,16 +89,12 @@ class ReminderScheduler:
         
         print("Starting reminder scheduler with Tokyo timezone...")
         
-        import pytz
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
-        
         # Get the scheduled time from kb.json
         kb_data = self._load_kb_data()
         remind_time = kb_data.get('リマインド時刻', '来店前日 09:00 自動配信')
         
         # Extract time from the string
-        import re
-        time_match = re.search(r'(\d{2}):(\d{2})', remind_time)
+        time_match = _TIME_RE.search(remind_time)
         if time_match:
             scheduled_hour = int(time_match.group(1))
             scheduled_minute = int(time_match.group(2))
@@ -140,30 +104,49 @@ class ReminderScheduler:
         
         print(f"Will run reminders at {scheduled_hour:02d}:{scheduled_minute:02d} Tokyo time")
         
-        while True:
+        # stop() may already have been called (e.g. shutdown before this thread started)
+        while not self._stop_event.is_set():
             try:
-                # Get current Tokyo time
-                current_tokyo_time = datetime.now(tokyo_tz)
-                current_hour = current_tokyo_time.hour
-                current_minute = current_tokyo_time.minute
+                current_tokyo_time = datetime.now(_TOKYO_TZ)
+                next_run = self._next_run_after(current_tokyo_time, scheduled_hour, scheduled_minute)
+                wait_seconds = (next_run - current_tokyo_time).total_seconds()
+                print(f"Next reminder run: {next_run.strftime('%Y-%m-%d %H:%M')} Tokyo time")
+                
+                # Sleep until the scheduled time instead of waking up every minute; stop() ends the wait
+                if self._stop_event.wait(max(wait_seconds, 0)):
+                    break
+                
+                current_tokyo_time = datetime.now(_TOKYO_TZ)
+                if current_tokyo_time < next_run:
+                    # Woke up early (e.g. the system clock was adjusted); wait for the remainder
+                    continue
                 
-                # Check if it's time to run reminders (Tokyo time)
-                # if current_hour == scheduled_hour and current_minute == scheduled_minute:
-                if current_hour == scheduled_hour and current_minute == scheduled_minute:
-                    print(f"Tokyo time {current_tokyo_time.strftime('%H:%M')} - Running reminders...")
-                    self._run_reminders()
-                    time.sleep(60)
-                else:
-                    print(f"Tokyo time {current_tokyo_time.strftime('%H:%M')} - Not running reminders")
-                    # Sleep for 30 seconds and check again
-                    time.sleep(60)
+                print(f"Tokyo time {current_tokyo_time.strftime('%H:%M')} - Running reminders...")
+                self._run_reminders()
                     
             except KeyboardInterrupt:
                 print("Scheduler stopped by user")
                 break
             except Exception as e:
                 logging.error(f"Error in scheduler loop: {e}")
-                time.sleep(60)  # Wait a minute before retrying
+                self._stop_event.wait(60)  # Wait a minute before retrying
+        
+        print("Reminder scheduler stopped")
+    
+    def stop(self):
+        """Stop the scheduler loop started by run_scheduler"""
+        self._stop_event.set()
+    
+    @staticmethod
+    def _next_run_after(current_time: datetime, hour: int, minute: int) -> datetime:
+        """Next occurrence of hour:minute strictly after current_time (same timezone)"""
+        next_run = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        
+        # If the time has already passed today, schedule for tomorrow
+        if next_run <= current_time:
+            next_run += timedelta(days=1)
+        
+        return next_run
     
     def run_reminders_now(self):
         """Manually run reminders (for testing)"""
@@ -180,8 +163,7 @@ class ReminderScheduler:
         remind_time = kb_data.get('REMIND_TIME', '来店前日 09:00 自動配信')
         
         # Extract time from the string
-        import re
-        time_match = re.search(r'(\d{2}):(\d{2})', remind_time)
+        time_match = _TIME_RE.search(remind_time)
         if time_match:
             scheduled_hour = int(time_match.group(1))
             scheduled_minute = int(time_match.group(2))
@@ -190,18 +172,7 @@ class ReminderScheduler:
             scheduled_minute = 0
         
         # Calculate next run time in Tokyo timezone
-        import pytz
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
-        current_tokyo_time = datetime.now(tokyo_tz)
-        
-        # Create next run time for today
-        next_run = current_tokyo_time.replace(hour=scheduled_hour, minute=scheduled_minute, second=0, microsecond=0)
-        
-        # If the time has already passed today, schedule for tomorrow
-        if next_run <= current_tokyo_time:
-            next_run += timedelta(days=1)
-        
-        return next_run
+        return self._next_run_after(datetime.now(_TOKYO_TZ), scheduled_hour, scheduled_minute)
     
     def get_status(self):
         """Get scheduler status with Tokyo timezone information"""
@@ -210,17 +181,16 @@ class ReminderScheduler:
         remind_time = kb_data.get('REMIND_TIME', '来店前日 09:00 自動配信')
         
         # Get current Tokyo time
-        import pytz
-        tokyo_tz = pytz.timezone('Asia/Tokyo')
-        current_tokyo_time = datetime.now(tokyo_tz)
+        current_tokyo_time = datetime.now(_TOKYO_TZ)
+        next_run = self.get_next_run_time()
         
         return {
             'enabled': self.enabled,
             'timezone': 'Asia/Tokyo',
             'current_tokyo_time': current_tokyo_time.strftime('%Y-%m-%d %H:%M:%S'),
             'remind_time': remind_time,
-            'next_run': self.get_next_run_time(),
-            'next_run_formatted': self.get_next_run_time().strftime('%Y-%m-%d %H:%M:%S') if self.get_next_run_time() else None
+            'next_run': next_run,
+            'next_run_formatted': next_run.strftime('%Y-%m-%d %H:%M:%S') if next_run else None
         }
 
 
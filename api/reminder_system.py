@@ -6,10 +6,11 @@ import os
 import json
 import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Mapping, Optional
 from datetime import datetime, timedelta
 import requests
 from dotenv import load_dotenv
+from api.kb_loader import load_kb_entries
 
 class ReminderSystem:
     def __init__(self):
@@ -122,73 +123,16 @@ class ReminderSystem:
             logging.error(f"Error parsing event to reservation: {e}")
             return None
     
-    def _load_kb_data(self) -> Dict[str, str]:
+    def _load_kb_data(self) -> Mapping[str, str]:
         """Load data from kb.json file"""
         try:
-            # Try multiple possible paths for different deployment environments
-            possible_paths = []
-            
-            # Try different base directories
-            base_dirs = [
-                os.path.dirname(os.path.abspath(__file__)),  # Current module directory
-                os.getcwd(),  # Current working directory
-                os.path.join(os.getcwd(), 'api'),  # api subdirectory of working directory
-            ]
-            
-            for base_dir in base_dirs:
-                possible_paths.append(os.path.join(base_dir, "data", "kb.json"))
-                possible_paths.append(os.path.join(base_dir, "api", "data", "kb.json"))
-                # Try with uppercase KB.json (for Render deployment)
-                possible_paths.append(os.path.join(base_dir, "data", "KB.json"))
-                possible_paths.append(os.path.join(base_dir, "api", "data", "KB.json"))
-            
-            # Debug: Print all attempted paths and their status
-            print(f"DEBUG: Attempting to load KB data in ReminderSystem")
-            for kb_file in possible_paths:
-                exists = os.path.exists(kb_file)
-                is_file = os.path.isfile(kb_file) if exists else False
-                print(f"DEBUG: Path: {kb_file} - Exists: {exists}, IsFile: {is_file}")
-            
-            # Try each possible path
-            for kb_file in possible_paths:
-                try:
-                    if not os.path.exists(kb_file):
-                        print(f"DEBUG: Path does not exist: {kb_file}")
-                        continue
-                    
-                    if not os.path.isfile(kb_file):
-                        print(f"DEBUG: Path is not a file: {kb_file}")
-                        continue
-                    
-                    print(f"DEBUG: Attempting to open: {kb_file}")
-                    with open(kb_file, 'r', encoding='utf-8') as f:
-                        kb_data = json.load(f)
-                    
-                    print(f"DEBUG: Successfully loaded KB data from: {kb_file}")
-                    
-                    # Convert array format to dictionary
-                    kb_dict = {}
-                    for item in kb_data:
-                        key = item.get('キー', '')
-                        value = item.get('例（置換値）', '')
-                        kb_dict[key] = value
-                    
-                    return kb_dict
-                except (FileNotFoundError, OSError) as e:
-                    print(f"DEBUG: Failed to load from {kb_file}: {e}")
-                    continue
-                except json.JSONDecodeError as e:
-                    print(f"DEBUG: JSON decode error from {kb_file}: {e}")
-                    continue
-            
-            # If none of the paths worked, raise an error
-            raise FileNotFoundError(f"Could not find kb.json file. Tried paths: {possible_paths}")
-            
+            # Reminders read the '例（置換値）' column of the shared entries
+            return {item.get('キー', ''): item.get('例（置換値）', '') for item in load_kb_entries()}
         except Exception as e:
             logging.error(f"Error loading kb.json: {e}")
             return {}
     
-    def _get_service_duration(self, service_name: str, kb_data: Optional[Dict[str, str]] = None) -> str:
+    def _get_service_duration(self, service_name: str, kb_data: Optional[Mapping[str, str]] = None) -> str:
         """Get service duration string for the given service"""
         if not service_name:
             return "N/A"
@@ -4,11 +4,16 @@ Reservation flow system with intent detection, candidate suggestions, and confir
 import re
 import os
 import json
+import threading
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime, timedelta
 import logging
 from api.google_calendar import GoogleCalendarHelper
 
+# Webhooks for different users are handled concurrently; the final availability check,
+# reservation ID and calendar insert must not interleave or two users can book one slot
+_BOOKING_LOCK = threading.Lock()
+
 class ReservationFlow:
     def __init__(self):
         self.user_states = {}  # Store user reservation states
@@ -817,30 +822,31 @@ class ReservationFlow:
             reservation_data = self.user_states[user_id]["data"].copy()
             print("reservation_data", reservation_data)
             
-            # CRITICAL: Check availability again before confirming to prevent race conditions
-            availability_check = self._check_final_availability(reservation_data)
-            if not availability_check["available"]:
-                # Slot is no longer available - inform user and clear state
-                del self.user_states[user_id]
-                return f"""❌ 申し訳ございませんが、選択された時間帯は既に他のお客様にご予約いただいておりました。
+            # Get client display name
+            client_name = self._get_line_display_name(user_id)
+            
+            with _BOOKING_LOCK:
+                # CRITICAL: Check availability again before confirming to prevent race conditions
+                availability_check = self._check_final_availability(reservation_data)
+                if not availability_check["available"]:
+                    # Slot is no longer available - inform user and clear state
+                    del self.user_states[user_id]
+                    return f"""❌ 申し訳ございませんが、選択された時間帯は既に他のお客様にご予約いただいておりました。
 
 {availability_check["message"]}
 
 別の時間帯でご予約いただけますでしょうか？
 「予約したい」とお送りください。"""
-            
-            # Generate reservation ID
-            reservation_id = self.google_calendar.generate_reservation_id(reservation_data['date'])
-            reservation_data['reservation_id'] = reservation_id
-            
-            # Get client display name
-            client_name = self._get_line_display_name(user_id)
-            
-            # Create calendar event immediately
-            calendar_success = self.google_calendar.create_reservation_event(
-                reservation_data, 
-                client_name
-            )
+                
+                # Generate reservation ID
+                reservation_id = self.google_calendar.generate_reservation_id(reservation_data['date'])
+                reservation_data['reservation_id'] = reservation_id
+                
+                # Create calendar event immediately
+                calendar_success = self.google_calendar.create_reservation_event(
+                    reservation_data, 
+                    client_name
+                )
             
             if not calendar_success:
                 logging.warning(f"Failed to create calendar event for user {user_id}")
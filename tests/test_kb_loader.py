@@ -0,0 +1,29 @@
+"""
+Tests for the shared kb.json loader
+"""
+import json
+
+from api.kb_loader import find_data_file, load_kb, load_kb_entries
+from api.reminder_system import ReminderSystem
+
+
+def _read_kb_file():
+    with open(find_data_file("data/kb.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_kb_is_parsed_once_and_shared():
+    assert load_kb() is load_kb()
+    assert load_kb_entries() is load_kb_entries()
+
+
+def test_load_kb_maps_keys_to_values():
+    expected = {item["キー"]: item["値"] for item in _read_kb_file() if item.get("キー") and item.get("値")}
+
+    assert dict(load_kb()) == expected
+
+
+def test_reminder_kb_data_reads_its_own_column():
+    expected = {item.get("キー", ""): item.get("例（置換値）", "") for item in _read_kb_file()}
+
+    assert ReminderSystem()._load_kb_data() == expected
@@ -0,0 +1,18 @@
+"""
+Tests for the reminder scheduler loop
+"""
+import threading
+
+from api.reminder_scheduler import ReminderScheduler
+
+
+def test_stop_before_run_ends_the_loop(monkeypatch):
+    monkeypatch.setenv("REMINDER_SCHEDULER_ENABLED", "true")
+    scheduler = ReminderScheduler()
+    scheduler.stop()
+
+    thread = threading.Thread(target=scheduler.run_scheduler, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
@@ -0,0 +1,108 @@
+"""
+Tests for concurrent reservation confirmation
+"""
+import sys
+import threading
+import time
+import types
+from unittest import mock
+
+import pytest
+
+from api.google_calendar import GoogleCalendarHelper
+from api.reservation_flow import ReservationFlow
+
+
+class _FakeCalendar:
+    """In-memory calendar whose availability check leaves time for another booking to interleave"""
+
+    def __init__(self):
+        self.events = []
+        self._helper = GoogleCalendarHelper()
+
+    def check_staff_availability_for_time(self, date_str, start_time, end_time, staff_name, *args, **kwargs):
+        booked = any(
+            event["date"] == date_str and event["start_time"] == start_time and event["staff"] == staff_name
+            for event in self.events
+        )
+        time.sleep(0.05)
+        return not booked
+
+    def check_user_time_conflict(self, *args, **kwargs):
+        return False
+
+    def generate_reservation_id(self, date_str):
+        return self._helper.generate_reservation_id(date_str)
+
+    def create_reservation_event(self, reservation_data, client_name):
+        self.events.append(dict(reservation_data))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def no_calendar_credentials(monkeypatch):
+    monkeypatch.delenv("GOOGLE_SERVICE_ACCOUNT_JSON", raising=False)
+
+
+@pytest.fixture
+def reservation_flow():
+    # Confirmation also saves to Sheets and sends a notification; keep both offline
+    offline_modules = {
+        "api.google_sheets_logger": types.SimpleNamespace(GoogleSheetsLogger=mock.MagicMock()),
+        "api.notification_manager": types.SimpleNamespace(
+            send_reservation_confirmation_notification=mock.MagicMock()
+        ),
+    }
+    with mock.patch.dict(sys.modules, offline_modules), \
+            mock.patch("api.reservation_flow.GoogleCalendarHelper", _FakeCalendar):
+        yield ReservationFlow()
+
+
+def test_concurrent_confirmations_book_a_slot_once(reservation_flow):
+    user_ids = ["U1", "U2"]
+    for user_id in user_ids:
+        reservation_flow.user_states[user_id] = {
+            "step": "confirmation",
+            "data": {
+                "user_id": user_id,
+                "date": "2025-01-15",
+                "time": "10:00",
+                "start_time": "10:00",
+                "end_time": "11:00",
+                "service": "カット",
+                "staff": "山田",
+            },
+        }
+
+    barrier = threading.Barrier(len(user_ids))
+    replies = {}
+
+    def confirm(user_id):
+        barrier.wait()
+        replies[user_id] = reservation_flow._handle_confirmation(user_id, "はい")
+
+    threads = [threading.Thread(target=confirm, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(reservation_flow.google_calendar.events) == 1
+    confirmed = [reply for reply in replies.values() if reply.startswith("✅")]
+    rejected = [reply for reply in replies.values() if reply.startswith("❌")]
+    assert len(confirmed) == 1 and len(rejected) == 1
+
+
+def test_concurrent_reservation_ids_are_unique():
+    calendar = GoogleCalendarHelper()
+    ids = []
+    threads = [
+        threading.Thread(target=lambda: ids.append(calendar.generate_reservation_id("2025-01-15")))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == len(ids)